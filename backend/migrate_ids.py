@@ -0,0 +1,59 @@
+"""
+One-off migration of documents written before model ids became the Mongo _id.
+
+Those documents have an ObjectId _id and the model id in an "id" field.
+This copies each one under its model id and then removes the original;
+references such as scrap_items.user_id already hold the model ids.
+
+Run it once with the API stopped: python migrate_ids.py
+
+A copy is always written before its original is deleted, so an interrupted
+run leaves both and never neither; rerunning finishes the job. The unique
+users.email index is dropped while copies and originals coexist and rebuilt
+at the end; after an interrupted run, startup fails to rebuild it until a
+rerun completes.
+"""
+
+import asyncio
+
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from server import _MODEL_COLLECTIONS, create_indexes, db, ensure_legacy_id_index, logger, mongo_client
+
+
+async def migrate_collection(collection) -> int:
+    """Re-key the collection's legacy documents, returning how many were moved"""
+    migrated = 0
+    async for doc in collection.find({"id": {"$type": "string"}}):
+        legacy_id = doc.pop("_id")
+        doc["_id"] = doc.pop("id")
+        try:
+            await collection.insert_one(doc)
+        except DuplicateKeyError:
+            # Only an existing copy from an interrupted run is expected here
+            if await collection.find_one({"_id": doc["_id"]}, projection={"_id": 1}) is None:
+                raise
+        await collection.delete_one({"_id": legacy_id})
+        migrated += 1
+    return migrated
+
+
+async def main():
+    for name in _MODEL_COLLECTIONS:
+        # Copies have no id field, which the old non-partial unique index rejects
+        await ensure_legacy_id_index(db[name])
+    try:
+        await db.users.drop_index("email_1")
+    except OperationFailure:
+        pass
+
+    for name in _MODEL_COLLECTIONS:
+        migrated = await migrate_collection(db[name])
+        logger.info("Migrated %d legacy %s documents to model-id keys", migrated, name)
+
+    await create_indexes()
+    mongo_client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
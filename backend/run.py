@@ -0,0 +1,27 @@
+"""
+Production entrypoint for the ScrapMaster backend.
+
+Runs Uvicorn with the uvloop event loop and httptools parser across
+several worker processes. Each worker opens its own Mongo pool, so
+MONGO_URL should carry a pool size with headroom, e.g.
+mongodb://host:27017/?maxPoolSize=100
+"""
+
+import os
+from pathlib import Path
+
+import uvicorn
+
+ROOT_DIR = Path(__file__).parent
+
+if __name__ == "__main__":
+    uvicorn.run(
+        "server:app",
+        app_dir=str(ROOT_DIR),
+        host=os.environ.get('HOST', '0.0.0.0'),
+        port=int(os.environ.get('PORT', '8001')),
+        workers=int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1)),
+        loop="uvloop",
+        http="httptools",
+        access_log=False
+    )
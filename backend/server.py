@@ -1,27 +1,84 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Request, Depends, Response
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Depends, Response, BackgroundTasks
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure
 import os
+import asyncio
+import atexit
+import orjson
 import logging
+import logging.handlers
+import queue
 from pathlib import Path
-from pydantic import BaseModel, Field
+from pydantic import AliasChoices, BaseModel, ConfigDict, Field
 from typing import List, Optional
 import uuid
+import hashlib
 from datetime import datetime, timezone, timedelta
 import httpx
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from contextlib import asynccontextmanager
+from cachetools import TTLCache
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Configure logging
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+logging.basicConfig(level=LOG_LEVEL, format=LOG_FORMAT)
+
+# App logs go through a queue so request handlers never block on the stream handler;
+# the listener thread runs once per process, however many times the lifespan runs
+_log_queue = queue.SimpleQueue()
+_log_stream_handler = logging.StreamHandler()
+_log_stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+log_listener = logging.handlers.QueueListener(_log_queue, _log_stream_handler)
+
+logger = logging.getLogger("scrap")
+logger.setLevel(LOG_LEVEL)
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+logger.propagate = False
+log_listener.start()
+atexit.register(log_listener.stop)
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+mongo_client = AsyncIOMotorClient(
+    mongo_url,
+    maxPoolSize=100,
+    minPoolSize=10,
+    compressors="zstd",
+    serverSelectionTimeoutMS=2000,
+    retryWrites=True,
+    tz_aware=True
+)
+db = mongo_client[os.environ['DB_NAME']]
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Shared HTTP client so outbound auth calls reuse keep-alive connections
+    app.state.http_client = httpx.AsyncClient(
+        limits=httpx.Limits(max_keepalive_connections=100, keepalive_expiry=30),
+        http2=True,
+        timeout=10
+    )
+    # The ping also warms the connection pool; the admin upsert waits for the
+    # unique email index so concurrent workers cannot insert duplicate admins
+    await asyncio.gather(
+        mongo_client.admin.command("ping"),
+        create_indexes()
+    )
+    await create_admin_user()
+    yield
+    await app.state.http_client.aclose()
+    mongo_client.close()
 
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -29,102 +86,211 @@ api_router = APIRouter(prefix="/api")
 # Security
 security = HTTPBearer()
 
+_UTC = timezone.utc
+
+def _now_utc() -> datetime:
+    return datetime.now(_UTC)
+
+def _new_id() -> str:
+    return uuid.uuid4().hex
+
 # Models
-class User(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+class AppModel(BaseModel):
+    """Base model with shared pydantic config"""
+    model_config = ConfigDict(extra='ignore', populate_by_name=True)
+
+def to_document(model: BaseModel) -> dict:
+    """Dump a model for insertion, storing its id as the Mongo _id"""
+    doc = model.model_dump(mode='python')
+    doc["_id"] = doc.pop("id")
+    return doc
+
+class User(AppModel):
+    id: str = Field(default_factory=_new_id, validation_alias=AliasChoices("id", "_id"))
     email: str
     name: str
     picture: Optional[str] = None
     role: str = "user"  # user or admin
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=_now_utc)
 
-class UserCreate(BaseModel):
+class UserCreate(AppModel):
     email: str
     name: str
     role: str = "user"
 
-class ScrapItem(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+class ScrapItem(AppModel):
+    id: str = Field(default_factory=_new_id, validation_alias=AliasChoices("id", "_id"))
     user_id: str
     scrap_type: str  # Metal, Paper, Plastic, Glass, Electronics
     weight: float  # in kg
     price_offered: float  # price offered by user
     status: str = "pending"  # pending, approved, rejected, sold
     description: Optional[str] = None
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=_now_utc)
+    updated_at: datetime = Field(default_factory=_now_utc)
 
-class ScrapItemCreate(BaseModel):
+class ScrapItemCreate(AppModel):
     scrap_type: str
     weight: float
     price_offered: float
     description: Optional[str] = None
 
-class ScrapItemUpdate(BaseModel):
+class ScrapItemUpdate(AppModel):
     status: str
-    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=_now_utc)
 
-class Company(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+class Company(AppModel):
+    id: str = Field(default_factory=_new_id, validation_alias=AliasChoices("id", "_id"))
     name: str
     contact: str
     address: str
     email: Optional[str] = None
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=_now_utc)
 
-class CompanyCreate(BaseModel):
+class CompanyCreate(AppModel):
     name: str
     contact: str
     address: str
     email: Optional[str] = None
 
-class Sale(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+class Sale(AppModel):
+    id: str = Field(default_factory=_new_id, validation_alias=AliasChoices("id", "_id"))
     scrap_item_id: str
     company_id: str
     selling_price: float
     profit: float
-    sold_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    sold_at: datetime = Field(default_factory=_now_utc)
 
-class SaleCreate(BaseModel):
+class SaleCreate(AppModel):
     scrap_item_id: str
     company_id: str
     selling_price: float
 
-class Transaction(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+class Transaction(AppModel):
+    id: str = Field(default_factory=_new_id, validation_alias=AliasChoices("id", "_id"))
     user_id: str
     scrap_item_id: str
     amount: float
     transaction_type: str  # buy, sell
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=_now_utc)
 
-class SessionData(BaseModel):
+class SessionData(AppModel):
     id: str
     email: str
     name: str
     picture: str
     session_token: str
 
+# Projections for reads that are returned as API models; documents not yet
+# migrated by migrate_ids.py keep their model id in "id" and an ObjectId _id
+_ID_FIELD = {"$ifNull": ["$id", "$_id"]}
+_SCRAP_PROJECTION = {
+    "_id": 0,
+    "id": _ID_FIELD,
+    "user_id": 1,
+    "scrap_type": 1,
+    "weight": 1,
+    "price_offered": 1,
+    "status": 1,
+    "description": 1,
+    "created_at": 1,
+    "updated_at": 1
+}
+_COMPANY_PROJECTION = {
+    "_id": 0,
+    "id": _ID_FIELD,
+    "name": 1,
+    "contact": 1,
+    "address": 1,
+    "email": 1,
+    "created_at": 1
+}
+# Admin listings read user/company details denormalized onto each document
+_ADMIN_SCRAP_PROJECTION = {
+    "_id": 0,
+    "id": _ID_FIELD,
+    "user_id": 1,
+    "scrap_type": 1,
+    "weight": 1,
+    "price_offered": 1,
+    "status": 1,
+    "description": 1,
+    "created_at": 1,
+    "updated_at": 1,
+    "user_name": 1,
+    "user_email": 1
+}
+_SALE_PROJECTION = {
+    "_id": 0,
+    "id": _ID_FIELD,
+    "scrap_item_id": 1,
+    "company_id": 1,
+    "selling_price": 1,
+    "profit": 1,
+    "sold_at": 1,
+    "scrap_type": 1,
+    "price_offered": 1,
+    "company_name": 1
+}
+
+# Resolved sessions, keyed by token hash; short TTL keeps logout/expiry windows tight
+_session_cache: TTLCache[bytes, tuple[User, datetime]] = TTLCache(maxsize=10000, ttl=30)
+
 # Helper functions
+async def find_by_id(collection, doc_id: str, **kwargs) -> Optional[dict]:
+    """Find a document by model id, falling back to the legacy id field"""
+    doc = await collection.find_one({"_id": doc_id}, **kwargs)
+    if doc is None:
+        doc = await collection.find_one({"id": doc_id}, **kwargs)
+    return doc
+
+async def find_by_ids(collection, ids, projection: dict) -> dict:
+    """Map model ids to documents with one $in query, falling back to the legacy id field"""
+    found = {}
+    if ids:
+        cursor = collection.find({"_id": {"$in": list(ids)}}, projection=projection)
+        found = {doc["_id"]: doc async for doc in cursor}
+        unresolved = set(ids) - found.keys()
+        if unresolved:
+            cursor = collection.find({"id": {"$in": list(unresolved)}}, projection={**projection, "id": 1})
+            found.update({doc["id"]: doc async for doc in cursor})
+    return found
+
+def session_cache_key(session_token: str) -> bytes:
+    """Hash session token for use as a cache key"""
+    return hashlib.sha256(session_token.encode()).digest()
+
 async def verify_session_token(session_token: str) -> Optional[User]:
     """Verify session token and return user data"""
+    cache_key = session_cache_key(session_token)
+    cached = _session_cache.get(cache_key)
+    if cached:
+        user, expires_at = cached
+        if expires_at > _now_utc():
+            return user
+        # Expired while cached; the TTL index removes the session document
+        _session_cache.pop(cache_key, None)
+        return None
+    
     try:
-        # Check if session exists in database
-        session = await db.sessions.find_one({"session_token": session_token})
+        # Only unexpired sessions match
+        session = await db.sessions.find_one(
+            {"session_token": session_token, "expires_at": {"$gt": _now_utc()}},
+            projection={"_id": 0, "user_id": 1, "expires_at": 1}
+        )
         if not session:
             return None
         
-        # Check if session is expired (7 days)
-        if session.get('expires_at') and session['expires_at'] < datetime.now(timezone.utc):
-            await db.sessions.delete_one({"session_token": session_token})
+        # Get user data
+        user = await find_by_id(db.users, session["user_id"])
+        if not user:
             return None
         
-        # Get user data
-        user = await db.users.find_one({"id": session["user_id"]})
-        return User(**user) if user else None
-    except Exception as e:
-        logging.error(f"Error verifying session: {e}")
+        user = User(**user)
+        _session_cache[cache_key] = (user, session["expires_at"])
+        return user
+    except Exception:
+        logger.exception("Error verifying session")
         return None
 
 async def get_current_user(request: Request) -> Optional[User]:
@@ -152,38 +318,143 @@ async def require_auth(request: Request) -> User:
         raise HTTPException(status_code=401, detail="Authentication required")
     return user
 
-async def require_admin(request: Request) -> User:
+async def require_admin(user: User = Depends(require_auth)) -> User:
     """Require admin authentication"""
-    user = await require_auth(request)
     if user.role != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     return user
 
+async def stream_json_array(cursor):
+    """Yield cursor documents as a JSON array, one batch at a time"""
+    yield b"["
+    first = True
+    async for doc in cursor:
+        if not first:
+            yield b","
+        first = False
+        yield orjson.dumps(doc)
+    yield b"]"
+
+async def with_user_details(cursor, batch_size: int = 200):
+    """Yield admin scrap rows, filling user details for items written before they were denormalized
+
+    Users are matched on _id, or on the legacy id field for users that
+    migrate_ids.py has not re-keyed yet
+    """
+    async def resolve(batch):
+        # One $in lookup on users._id per batch instead of a query per row
+        missing = {doc["user_id"] for doc in batch if "user_name" not in doc}
+        users = await find_by_ids(db.users, missing, {"name": 1, "email": 1})
+        for doc in batch:
+            user_id = doc.pop("user_id")
+            if "user_name" not in doc:
+                user = users.get(user_id, {})
+                doc["user_name"] = user.get("name")
+                doc["user_email"] = user.get("email")
+        return batch
+    
+    batch = []
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            for row in await resolve(batch):
+                yield row
+            batch = []
+    for row in await resolve(batch):
+        yield row
+
+async def with_sale_details(sales: list) -> list:
+    """Fill item and company details on sales recorded before they were denormalized"""
+    legacy = [sale for sale in sales if "company_name" not in sale]
+    if legacy:
+        items, companies = await asyncio.gather(
+            find_by_ids(db.scrap_items, {sale["scrap_item_id"] for sale in legacy}, {"scrap_type": 1, "price_offered": 1}),
+            find_by_ids(db.companies, {sale["company_id"] for sale in legacy}, {"name": 1})
+        )
+        for sale in legacy:
+            item = items.get(sale["scrap_item_id"], {})
+            sale["scrap_type"] = item.get("scrap_type")
+            sale["price_offered"] = item.get("price_offered")
+            sale["company_name"] = companies.get(sale["company_id"], {}).get("name")
+    return sales
+
+async def sync_user_details(user_id: str, name: str, email: str):
+    """Refresh user details denormalized onto the user's scrap items"""
+    await db.scrap_items.update_many(
+        {"user_id": user_id},
+        {"$set": {"user_name": name, "user_email": email}}
+    )
+
+# Collections whose documents are keyed by their model id
+_MODEL_COLLECTIONS = ("users", "scrap_items", "companies", "sales", "transactions")
+
+async def ensure_legacy_id_index(collection):
+    """Index the legacy id field the by-id reads fall back to, on documents that still have one"""
+    indexes = await collection.index_information()
+    if "id_1" in indexes and "partialFilterExpression" not in indexes["id_1"]:
+        # The pre-_id unique index also covers id-less documents, which all collide on null;
+        # another worker may have dropped it first
+        try:
+            await collection.drop_index("id_1")
+        except OperationFailure:
+            pass
+    await collection.create_index("id", unique=True, partialFilterExpression={"id": {"$type": "string"}})
+
+# Initialize database indexes
+async def create_indexes():
+    """Create indexes for the fields every endpoint filters on"""
+    await db.sessions.create_index("session_token", unique=True)
+    # TTL index: Mongo purges sessions once expires_at has passed
+    await db.sessions.create_index("expires_at", expireAfterSeconds=0)
+    await db.users.create_index("email", unique=True)
+    await db.scrap_items.create_index([("user_id", 1), ("status", 1)])
+    await db.scrap_items.create_index("status")
+    await db.sales.create_index("scrap_item_id")
+    for name in _MODEL_COLLECTIONS:
+        await ensure_legacy_id_index(db[name])
+
 # Initialize admin user
 async def create_admin_user():
     """Create default admin user if not exists"""
-    admin_email = "admin@scrapmaster.com"
-    existing_admin = await db.users.find_one({"email": admin_email})
-    
-    if not existing_admin:
-        admin_user = User(
-            email=admin_email,
-            name="System Admin",
-            role="admin"
-        )
-        await db.users.insert_one(admin_user.dict())
-        logging.info("Admin user created successfully")
+    admin_user = User(
+        email="admin@scrapmaster.com",
+        name="System Admin",
+        role="admin"
+    )
+    
+    # Upsert keeps this a single idempotent round trip, safe across workers
+    result = await db.users.update_one(
+        {"email": admin_user.email},
+        {"$setOnInsert": to_document(admin_user)},
+        upsert=True
+    )
+    if result.upserted_id is not None:
+        logger.info("Admin user created successfully")
 
 # Auth routes
+_FRONTEND_URL = os.environ.get('FRONTEND_URL', 'https://scrapmaster-1.preview.emergentagent.com')
+_AUTH_URL = f"https://auth.emergentagent.com/?redirect={_FRONTEND_URL}"
+_AUTH_LOGIN_BODY = orjson.dumps({"auth_url": _AUTH_URL})
+_AUTH_LOGIN_HEADERS = {"Cache-Control": "public, max-age=3600"}
+
 @api_router.get("/auth/login")
 async def initiate_login():
     """Redirect to Emergent Auth"""
-    preview_url = os.environ.get('FRONTEND_URL', 'https://scrapmaster-1.preview.emergentagent.com')
-    auth_url = f"https://auth.emergentagent.com/?redirect={preview_url}"
-    return {"auth_url": auth_url}
+    return Response(content=_AUTH_LOGIN_BODY, media_type="application/json", headers=_AUTH_LOGIN_HEADERS)
+
+_AUTH_SESSION_DATA_URL = "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data"
+_AUTH_TIMEOUT = httpx.Timeout(5.0, connect=2.0)
+
+async def fetch_session_data(client: httpx.AsyncClient, session_id: str) -> httpx.Response:
+    """Fetch session data from Emergent Auth, retrying once if the connection fails"""
+    headers = {"X-Session-ID": session_id}
+    try:
+        return await client.get(_AUTH_SESSION_DATA_URL, headers=headers, timeout=_AUTH_TIMEOUT)
+    except httpx.ConnectError:
+        return await client.get(_AUTH_SESSION_DATA_URL, headers=headers, timeout=_AUTH_TIMEOUT)
 
 @api_router.get("/auth/profile")
-async def get_profile(request: Request):
+async def get_profile(request: Request, background_tasks: BackgroundTasks):
     """Get user profile from session"""
     session_id = request.headers.get("X-Session-ID")
     
@@ -192,55 +463,64 @@ async def get_profile(request: Request):
     
     try:
         # Call Emergent Auth API
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data",
-                headers={"X-Session-ID": session_id}
-            )
-            
-            if response.status_code != 200:
-                raise HTTPException(status_code=401, detail="Invalid session")
-            
-            session_data = SessionData(**response.json())
-            
-            # Check if user exists, create if not
-            existing_user = await db.users.find_one({"email": session_data.email})
-            
-            if not existing_user:
-                # Create new user
-                user = User(
-                    email=session_data.email,
-                    name=session_data.name,
-                    picture=session_data.picture,
-                    role="user"
-                )
-                await db.users.insert_one(user.dict())
-            else:
-                user = User(**existing_user)
-            
-            # Create session
-            expires_at = datetime.now(timezone.utc) + timedelta(days=7)
-            session_record = {
-                "user_id": user.id,
-                "session_token": session_data.session_token,
-                "expires_at": expires_at,
-                "created_at": datetime.now(timezone.utc)
-            }
-            
-            # Update or insert session
-            await db.sessions.update_one(
-                {"session_token": session_data.session_token},
-                {"$set": session_record},
-                upsert=True
+        response = await fetch_session_data(request.app.state.http_client, session_id)
+        
+        if response.status_code != 200:
+            raise HTTPException(status_code=401, detail="Invalid session")
+        
+        session_data = SessionData(**response.json())
+        
+        # Get the user, creating it if needed, before the session points at it; a single
+        # upsert means concurrent first logins settle on the same stored user
+        new_user = User(
+            email=session_data.email,
+            name=session_data.name,
+            picture=session_data.picture,
+            role="user"
+        )
+        try:
+            user_doc = await db.users.find_one_and_update(
+                {"email": session_data.email},
+                {"$setOnInsert": to_document(new_user)},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
             )
-            
-            return {
-                "user": user,
-                "session_token": session_data.session_token
-            }
-    
-    except httpx.RequestError as e:
-        logging.error(f"Auth API error: {e}")
+        except DuplicateKeyError:
+            # Lost the insert race on the unique email index; the winner's user is stored
+            user_doc = await db.users.find_one({"email": session_data.email})
+        user = User(**user_doc)
+        writes = []
+        
+        if user.name != session_data.name:
+            # Keep the stored profile and its denormalized copies current
+            user.name = session_data.name
+            writes.append(db.users.update_one({"_id": user_doc["_id"]}, {"$set": {"name": user.name}}))
+            background_tasks.add_task(sync_user_details, user.id, user.name, user.email)
+        
+        # Create session
+        now = _now_utc()
+        session_record = {
+            "user_id": user.id,
+            "session_token": session_data.session_token,
+            "expires_at": now + timedelta(days=7),
+            "created_at": now
+        }
+        
+        # Update or insert session alongside any name update; the stored user id is known
+        writes.append(db.sessions.update_one(
+            {"session_token": session_data.session_token},
+            {"$set": session_record},
+            upsert=True
+        ))
+        await asyncio.gather(*writes)
+        
+        return {
+            "user": user,
+            "session_token": session_data.session_token
+        }
+    
+    except httpx.RequestError:
+        logger.exception("Auth API error")
         raise HTTPException(status_code=500, detail="Authentication service error")
 
 @api_router.post("/auth/logout")
@@ -250,6 +530,7 @@ async def logout(request: Request, response: Response):
     if user:
         session_token = request.cookies.get("session_token")
         if session_token:
+            _session_cache.pop(session_cache_key(session_token), None)
             await db.sessions.delete_one({"session_token": session_token})
     
     response.delete_cookie("session_token")
@@ -257,24 +538,20 @@ async def logout(request: Request, response: Response):
 
 # User routes
 @api_router.get("/users/me")
-async def get_current_user_info(request: Request):
+async def get_current_user_info(user: User = Depends(require_auth)):
     """Get current user information"""
-    user = await require_auth(request)
     return user
 
 # Scrap item routes
 @api_router.post("/scrap-items", response_model=ScrapItem)
-async def create_scrap_item(item: ScrapItemCreate, request: Request):
+async def create_scrap_item(item: ScrapItemCreate, user: User = Depends(require_auth)):
     """Create new scrap item"""
-    user = await require_auth(request)
     
     scrap_item = ScrapItem(
         user_id=user.id,
-        **item.dict()
+        **item.model_dump(mode='python')
     )
     
-    await db.scrap_items.insert_one(scrap_item.dict())
-    
     # Create transaction record
     transaction = Transaction(
         user_id=user.id,
@@ -282,64 +559,41 @@ async def create_scrap_item(item: ScrapItemCreate, request: Request):
         amount=scrap_item.price_offered,
         transaction_type="buy"
     )
-    await db.transactions.insert_one(transaction.dict())
+    
+    scrap_doc = to_document(scrap_item)
+    scrap_doc["user_name"] = user.name
+    scrap_doc["user_email"] = user.email
+    
+    # Independent collections, so both inserts can share one round trip
+    await asyncio.gather(
+        db.scrap_items.insert_one(scrap_doc),
+        db.transactions.insert_one(to_document(transaction))
+    )
     
     return scrap_item
 
 @api_router.get("/scrap-items", response_model=List[ScrapItem])
-async def get_scrap_items(request: Request):
+async def get_scrap_items(user: User = Depends(require_auth)):
     """Get scrap items for current user"""
-    user = await require_auth(request)
     
-    scrap_items = await db.scrap_items.find({"user_id": user.id}).to_list(1000)
-    return [ScrapItem(**item) for item in scrap_items]
+    cursor = db.scrap_items.find({"user_id": user.id}, projection=_SCRAP_PROJECTION).limit(1000).batch_size(200)
+    return [ScrapItem.model_construct(**item) async for item in cursor]
 
-@api_router.get("/scrap-items/all", response_model=List[dict])
-async def get_all_scrap_items(request: Request):
+@api_router.get("/scrap-items/all", response_class=StreamingResponse)
+async def get_all_scrap_items(user: User = Depends(require_admin)):
     """Get all scrap items with user info (admin only)"""
-    await require_admin(request)
     
-    # Aggregation to join with users
-    pipeline = [
-        {
-            "$lookup": {
-                "from": "users",
-                "localField": "user_id",
-                "foreignField": "id",
-                "as": "user"
-            }
-        },
-        {
-            "$unwind": "$user"
-        },
-        {
-            "$project": {
-                "id": 1,
-                "scrap_type": 1,
-                "weight": 1,
-                "price_offered": 1,
-                "status": 1,
-                "description": 1,
-                "created_at": 1,
-                "updated_at": 1,
-                "user_name": "$user.name",
-                "user_email": "$user.email"
-            }
-        }
-    ]
-    
-    scrap_items = await db.scrap_items.aggregate(pipeline).to_list(1000)
-    return scrap_items
+    cursor = db.scrap_items.find(projection=_ADMIN_SCRAP_PROJECTION).batch_size(200)
+    return StreamingResponse(stream_json_array(with_user_details(cursor)), media_type="application/json")
 
 @api_router.put("/scrap-items/{item_id}/status")
-async def update_scrap_item_status(item_id: str, update: ScrapItemUpdate, request: Request):
+async def update_scrap_item_status(item_id: str, update: ScrapItemUpdate, user: User = Depends(require_admin)):
     """Update scrap item status (admin only)"""
-    await require_admin(request)
     
-    result = await db.scrap_items.update_one(
-        {"id": item_id},
-        {"$set": update.dict()}
-    )
+    changes = {"$set": update.model_dump(mode='python')}
+    result = await db.scrap_items.update_one({"_id": item_id}, changes)
+    if result.matched_count == 0:
+        result = await db.scrap_items.update_one({"id": item_id}, changes)
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Scrap item not found")
@@ -348,33 +602,36 @@ async def update_scrap_item_status(item_id: str, update: ScrapItemUpdate, reques
 
 # Company routes
 @api_router.post("/companies", response_model=Company)
-async def create_company(company: CompanyCreate, request: Request):
+async def create_company(company: CompanyCreate, user: User = Depends(require_admin)):
     """Create new company (admin only)"""
-    await require_admin(request)
     
-    company_obj = Company(**company.dict())
-    await db.companies.insert_one(company_obj.dict())
+    company_obj = Company(**company.model_dump(mode='python'))
+    await db.companies.insert_one(to_document(company_obj))
     return company_obj
 
 @api_router.get("/companies", response_model=List[Company])
-async def get_companies(request: Request):
+async def get_companies(user: User = Depends(require_admin)):
     """Get all companies (admin only)"""
-    await require_admin(request)
     
-    companies = await db.companies.find().to_list(1000)
-    return [Company(**company) for company in companies]
+    cursor = db.companies.find(projection=_COMPANY_PROJECTION).limit(1000).batch_size(200)
+    return [Company.model_construct(**company) async for company in cursor]
 
 # Sales routes
 @api_router.post("/sales", response_model=Sale)
-async def create_sale(sale: SaleCreate, request: Request):
+async def create_sale(sale: SaleCreate, user: User = Depends(require_admin)):
     """Sell scrap to company (admin only)"""
-    await require_admin(request)
     
-    # Get scrap item to calculate profit
-    scrap_item = await db.scrap_items.find_one({"id": sale.scrap_item_id})
+    # Get scrap item to calculate profit, and the company to record on the sale
+    scrap_item, company = await asyncio.gather(
+        find_by_id(db.scrap_items, sale.scrap_item_id),
+        find_by_id(db.companies, sale.company_id, projection={"name": 1})
+    )
     if not scrap_item:
         raise HTTPException(status_code=404, detail="Scrap item not found")
     
+    if not company:
+        raise HTTPException(status_code=404, detail="Company not found")
+    
     if scrap_item["status"] != "approved":
         raise HTTPException(status_code=400, detail="Can only sell approved scrap items")
     
@@ -383,15 +640,7 @@ async def create_sale(sale: SaleCreate, request: Request):
     
     sale_obj = Sale(
         profit=profit,
-        **sale.dict()
-    )
-    
-    await db.sales.insert_one(sale_obj.dict())
-    
-    # Update scrap item status to sold
-    await db.scrap_items.update_one(
-        {"id": sale.scrap_item_id},
-        {"$set": {"status": "sold", "updated_at": datetime.now(timezone.utc)}}
+        **sale.model_dump(mode='python')
     )
     
     # Create sell transaction
@@ -401,56 +650,52 @@ async def create_sale(sale: SaleCreate, request: Request):
         amount=sale.selling_price,
         transaction_type="sell"
     )
-    await db.transactions.insert_one(transaction.dict())
+    
+    sale_doc = to_document(sale_obj)
+    sale_doc["scrap_type"] = scrap_item["scrap_type"]
+    sale_doc["price_offered"] = scrap_item["price_offered"]
+    sale_doc["company_name"] = company["name"]
+    
+    # Record the sale, mark the scrap item sold and log the transaction concurrently
+    await asyncio.gather(
+        db.sales.insert_one(sale_doc),
+        db.scrap_items.update_one(
+            {"_id": scrap_item["_id"]},
+            {"$set": {"status": "sold", "updated_at": _now_utc()}}
+        ),
+        db.transactions.insert_one(to_document(transaction))
+    )
     
     return sale_obj
 
-@api_router.get("/sales", response_model=List[dict])
-async def get_sales(request: Request):
+@api_router.get("/sales", response_model=None)
+async def get_sales(user: User = Depends(require_admin)):
     """Get all sales with details (admin only)"""
-    await require_admin(request)
     
+    cursor = db.sales.find(projection=_SALE_PROJECTION).limit(1000).batch_size(200)
+    return ORJSONResponse(await with_sale_details([sale async for sale in cursor]))
+
+# Dashboard routes
+async def count_scrap_items_by_status(match: dict) -> dict:
+    """Count total/pending/approved/sold scrap items in a single aggregation"""
     pipeline = [
-        {
-            "$lookup": {
-                "from": "scrap_items",
-                "localField": "scrap_item_id",
-                "foreignField": "id",
-                "as": "scrap_item"
-            }
-        },
-        {
-            "$lookup": {
-                "from": "companies",
-                "localField": "company_id",
-                "foreignField": "id",
-                "as": "company"
-            }
-        },
-        {
-            "$unwind": "$scrap_item"
-        },
-        {
-            "$unwind": "$company"
-        }
+        {"$match": match},
+        {"$facet": {
+            "total": [{"$count": "n"}],
+            "pending": [{"$match": {"status": "pending"}}, {"$count": "n"}],
+            "approved": [{"$match": {"status": "approved"}}, {"$count": "n"}],
+            "sold": [{"$match": {"status": "sold"}}, {"$count": "n"}]
+        }}
     ]
     
-    sales = await db.sales.aggregate(pipeline).to_list(1000)
-    return sales
+    facets = (await db.scrap_items.aggregate(pipeline).to_list(1))[0]
+    return {key: bucket[0]["n"] if bucket else 0 for key, bucket in facets.items()}
 
-# Dashboard routes
 @api_router.get("/dashboard/stats")
-async def get_dashboard_stats(request: Request):
+async def get_dashboard_stats(user: User = Depends(require_auth)):
     """Get dashboard statistics"""
-    user = await require_auth(request)
     
     if user.role == "admin":
-        # Admin dashboard stats
-        total_scrap_items = await db.scrap_items.count_documents({})
-        pending_items = await db.scrap_items.count_documents({"status": "pending"})
-        approved_items = await db.scrap_items.count_documents({"status": "approved"})
-        sold_items = await db.scrap_items.count_documents({"status": "sold"})
-        
         # Calculate total revenue and profit
         sales_pipeline = [
             {"$group": {
@@ -460,74 +705,78 @@ async def get_dashboard_stats(request: Request):
             }}
         ]
         
-        sales_stats = await db.sales.aggregate(sales_pipeline).to_list(1)
+        # Admin dashboard stats
+        counts, sales_stats, total_companies = await asyncio.gather(
+            count_scrap_items_by_status({}),
+            db.sales.aggregate(sales_pipeline).to_list(1),
+            db.companies.count_documents({})
+        )
         total_revenue = sales_stats[0]["total_revenue"] if sales_stats else 0
         total_profit = sales_stats[0]["total_profit"] if sales_stats else 0
         
         return {
-            "total_scrap_items": total_scrap_items,
-            "pending_items": pending_items,
-            "approved_items": approved_items,
-            "sold_items": sold_items,
+            "total_scrap_items": counts["total"],
+            "pending_items": counts["pending"],
+            "approved_items": counts["approved"],
+            "sold_items": counts["sold"],
             "total_revenue": total_revenue,
             "total_profit": total_profit,
-            "total_companies": await db.companies.count_documents({})
+            "total_companies": total_companies
         }
     else:
-        # User dashboard stats
-        user_scrap_items = await db.scrap_items.count_documents({"user_id": user.id})
-        user_pending = await db.scrap_items.count_documents({"user_id": user.id, "status": "pending"})
-        user_approved = await db.scrap_items.count_documents({"user_id": user.id, "status": "approved"})
-        user_sold = await db.scrap_items.count_documents({"user_id": user.id, "status": "sold"})
-        
         # Calculate user earnings
-        user_transactions = await db.transactions.find({"user_id": user.id, "transaction_type": "sell"}).to_list(1000)
-        total_earnings = sum(t["amount"] for t in user_transactions)
+        earnings_pipeline = [
+            {"$match": {"user_id": user.id, "transaction_type": "sell"}},
+            {"$group": {"_id": None, "total_earnings": {"$sum": "$amount"}}}
+        ]
+        
+        # User dashboard stats
+        counts, earnings = await asyncio.gather(
+            count_scrap_items_by_status({"user_id": user.id}),
+            db.transactions.aggregate(earnings_pipeline).to_list(1)
+        )
+        total_earnings = earnings[0]["total_earnings"] if earnings else 0
         
         return {
-            "total_items": user_scrap_items,
-            "pending_items": user_pending,
-            "approved_items": user_approved,
-            "sold_items": user_sold,
+            "total_items": counts["total"],
+            "pending_items": counts["pending"],
+            "approved_items": counts["approved"],
+            "sold_items": counts["sold"],
             "total_earnings": total_earnings
         }
 
 # Scrap types endpoint
+_SCRAP_TYPES_BODY = orjson.dumps({
+    "scrap_types": [
+        "Metal",
+        "Paper",
+        "Plastic",
+        "Glass",
+        "Electronics"
+    ]
+})
+_SCRAP_TYPES_HEADERS = {"Cache-Control": "public, max-age=86400"}
+
 @api_router.get("/scrap-types")
 async def get_scrap_types():
     """Get available scrap types"""
-    return {
-        "scrap_types": [
-            "Metal",
-            "Paper", 
-            "Plastic",
-            "Glass",
-            "Electronics"
-        ]
-    }
+    return Response(content=_SCRAP_TYPES_BODY, media_type="application/json", headers=_SCRAP_TYPES_HEADERS)
 
 # Include the router in the main app
 app.include_router(api_router)
 
+# Credentialed requests can't use a wildcard origin, so fall back to the frontend
+# rather than having the middleware echo back every request's origin
+CORS_ORIGINS = frozenset(
+    origin.strip() for origin in os.environ.get('CORS_ORIGINS', '*').split(',') if origin.strip()
+)
+if not CORS_ORIGINS or '*' in CORS_ORIGINS:
+    CORS_ORIGINS = frozenset({_FRONTEND_URL})
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
+    allow_origins=sorted(CORS_ORIGINS),
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
-
-@app.on_event("startup")
-async def startup_db():
-    await create_admin_user()
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
@@ -4,117 +4,95 @@ Integration Testing for ScrapMaster Backend
 Tests API structure, data models, and endpoint behavior
 """
 
-import requests
-import json
-from datetime import datetime
+import os
+from operator import itemgetter
+from probes import FULL, PROBES, AUTH_REJECTED, request, send_all, run_batch, run_probes, get_cached, clear_results, ResultRecorder, json_loads, json_dumps
 
-BASE_URL = "https://scrapmaster-1.preview.emergentagent.com/api"
+_loc = itemgetter("loc")
 
-class ScrapMasterIntegrationTester:
-    def __init__(self):
-        self.session = requests.Session()
-        self.test_results = []
-        
-    def log_result(self, test_name, success, message, details=None):
-        """Log test result"""
-        result = {
-            "test": test_name,
-            "success": success,
-            "message": message,
-            "timestamp": datetime.now().isoformat(),
-            "details": details or {}
-        }
-        self.test_results.append(result)
-        status = "✅ PASS" if success else "❌ FAIL"
-        print(f"{status}: {test_name} - {message}")
-        if details and not success:
-            print(f"   Details: {details}")
-    
-    def test_api_structure(self):
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Auth runs before body validation, so field errors are only reachable with a session;
+# use an admin session token to cover the admin-only endpoints as well
+SESSION_TOKEN = os.environ.get("SCRAPMASTER_SESSION_TOKEN")
+_AUTH_HEADERS = {"Authorization": f"Bearer {SESSION_TOKEN}"} if SESSION_TOKEN else {}
+
+# Invalid bodies for the POST endpoints and the fields their validation errors should name
+VALIDATION_TESTS = [
+    # Scrap item validation
+    {
+        "endpoint": "/scrap-items",
+        "data": {"invalid": "data"},
+        "expected_fields": ["scrap_type", "weight", "price_offered"]
+    },
+    # Company validation
+    {
+        "endpoint": "/companies",
+        "data": {"name": "Test"},
+        "expected_fields": ["contact", "address"]
+    },
+    # Sales validation
+    {
+        "endpoint": "/sales",
+        "data": {"selling_price": 100},
+        "expected_fields": ["scrap_item_id", "company_id"]
+    }
+]
+VALIDATION_REQUESTS = [("POST", test["endpoint"], {"json": test["data"], "headers": _AUTH_HEADERS}) for test in VALIDATION_TESTS]
+
+# Acceptable statuses per endpoint in test_error_handling
+EXPECTED_ERROR_STATUSES = {
+    "/scrap-items/nonexistent-id/status": frozenset({401, 404}),  # 401 if auth required first
+    "/scrap-items": frozenset({400, 401, 422}),
+}
+
+class ScrapMasterIntegrationTester(ResultRecorder):
+    def test_api_structure(self, results=None):
         """Test API structure and endpoint availability"""
-        endpoints_to_test = [
-            # Auth endpoints
-            ("/auth/login", "GET", 200),
-            ("/auth/profile", "GET", 400),  # Should fail without session
-            ("/auth/logout", "POST", 200),
-            
-            # Public endpoints
-            ("/scrap-types", "GET", 200),
-            
-            # Protected endpoints (should return 401)
-            ("/users/me", "GET", 401),
-            ("/scrap-items", "GET", 401),
-            ("/dashboard/stats", "GET", 401),
-            
-            # Admin endpoints (should return 401)
-            ("/scrap-items/all", "GET", 401),
-            ("/companies", "GET", 401),
-            ("/sales", "GET", 401),
-        ]
+        if results is None:
+            results = run_probes(PROBES)
         
         all_correct = True
-        for endpoint, method, expected_status in endpoints_to_test:
-            try:
-                if method == "GET":
-                    response = self.session.get(f"{BASE_URL}{endpoint}")
-                elif method == "POST":
-                    response = self.session.post(f"{BASE_URL}{endpoint}")
-                
-                if response.status_code == expected_status:
-                    self.log_result(f"API Structure {endpoint}", True, f"{method} {endpoint} returns expected status {expected_status}")
-                else:
-                    self.log_result(f"API Structure {endpoint}", False, f"{method} {endpoint} returned {response.status_code}, expected {expected_status}")
-                    all_correct = False
-            except Exception as e:
-                self.log_result(f"API Structure {endpoint}", False, f"Error testing {endpoint}: {str(e)}")
+        for method, endpoint, expected_status in PROBES:
+            response = results[(method, endpoint)]
+            if isinstance(response, Exception):
+                self.log_result(f"API Structure {endpoint}", False, f"Error testing {endpoint}: {str(response)}")
+                all_correct = False
+            elif response.status_code == expected_status:
+                self.log_result(f"API Structure {endpoint}", True, f"{method} {endpoint} returns expected status {expected_status}")
+            else:
+                self.log_result(f"API Structure {endpoint}", False, f"{method} {endpoint} returned {response.status_code}, expected {expected_status}")
                 all_correct = False
         
         return all_correct
     
-    def test_data_validation(self):
+    def test_data_validation(self, outcomes=None):
         """Test data validation on POST endpoints"""
-        validation_tests = [
-            # Scrap item validation
-            {
-                "endpoint": "/scrap-items",
-                "data": {"invalid": "data"},
-                "expected_fields": ["scrap_type", "weight", "price_offered"]
-            },
-            # Company validation  
-            {
-                "endpoint": "/companies",
-                "data": {"name": "Test"},
-                "expected_fields": ["contact", "address"]
-            },
-            # Sales validation
-            {
-                "endpoint": "/sales", 
-                "data": {"selling_price": 100},
-                "expected_fields": ["scrap_item_id", "company_id"]
-            }
-        ]
+        if outcomes is None:
+            outcomes = send_all(VALIDATION_REQUESTS)
         
         all_valid = True
-        for test in validation_tests:
+        for test, response in zip(VALIDATION_TESTS, outcomes):
+            if isinstance(response, Exception):
+                self.log_result(f"Data Validation {test['endpoint']}", False, f"Error testing validation: {str(response)}")
+                all_valid = False
+                continue
             try:
-                response = self.session.post(f"{BASE_URL}{test['endpoint']}", json=test["data"])
-                
                 if response.status_code == 422:
                     # Check if validation errors mention expected fields
-                    error_data = response.json()
+                    error_data = json_loads(response.content)
                     if "detail" in error_data:
-                        error_fields = []
-                        for error in error_data["detail"]:
-                            if "loc" in error and len(error["loc"]) > 1:
-                                error_fields.append(error["loc"][1])
-                        
-                        missing_expected = [field for field in test["expected_fields"] if field in error_fields]
+                        error_fields = {loc[1] for loc in (_loc(e) for e in error_data["detail"] if "loc" in e) if len(loc) > 1}
+                        missing_expected = sorted(set(test["expected_fields"]) & error_fields)
                         if missing_expected:
                             self.log_result(f"Data Validation {test['endpoint']}", True, f"Correctly validates required fields: {missing_expected}")
                         else:
                             self.log_result(f"Data Validation {test['endpoint']}", True, f"Returns validation errors as expected")
                     else:
                         self.log_result(f"Data Validation {test['endpoint']}", True, "Returns 422 validation error as expected")
+                elif response.status_code in AUTH_REJECTED:
+                    # Auth dependencies run before body validation, so nothing was validated
+                    self.log_skip(f"Data Validation {test['endpoint']}", f"Refused with {response.status_code} before validation; set SCRAPMASTER_SESSION_TOKEN to check field errors")
                 else:
                     self.log_result(f"Data Validation {test['endpoint']}", False, f"Expected 422 validation error, got {response.status_code}")
                     all_valid = False
@@ -145,10 +123,10 @@ class ScrapMasterIntegrationTester:
         for test in format_tests:
             try:
                 if test["method"] == "GET":
-                    response = self.session.get(f"{BASE_URL}{test['endpoint']}")
+                    status, headers, body = get_cached(test["endpoint"])
                 
-                if response.status_code == 200:
-                    data = response.json()
+                if status == 200:
+                    data = json_loads(body)
                     
                     # Check required keys
                     missing_keys = [key for key in test["expected_keys"] if key not in data]
@@ -169,7 +147,7 @@ class ScrapMasterIntegrationTester:
                     else:
                         self.log_result(f"Response Format {test['endpoint']}", True, f"Response format correct with keys: {list(data.keys())}")
                 else:
-                    self.log_result(f"Response Format {test['endpoint']}", False, f"Endpoint returned {response.status_code}")
+                    self.log_result(f"Response Format {test['endpoint']}", False, f"Endpoint returned {status}")
                     all_correct = False
             except Exception as e:
                 self.log_result(f"Response Format {test['endpoint']}", False, f"Error testing format: {str(e)}")
@@ -184,38 +162,27 @@ class ScrapMasterIntegrationTester:
             {
                 "endpoint": "/scrap-items/nonexistent-id/status",
                 "method": "PUT",
-                "data": {"status": "approved"},
-                "expected_status": [401, 404]  # 401 if auth required first
+                "data": json_dumps({"status": "approved"})
             },
             # Invalid JSON
             {
                 "endpoint": "/scrap-items",
                 "method": "POST", 
-                "data": "invalid json",
-                "expected_status": [400, 401, 422]
+                "data": "invalid json"
             }
         ]
         
         all_handled = True
         for test in error_tests:
             try:
-                headers = {"Content-Type": "application/json"}
+                # Bodies are pre-serialized (or deliberately invalid), so send them as-is
+                response = request(test["method"], FULL[test["endpoint"]], data=test["data"], headers=_JSON_HEADERS)
                 
-                if test["method"] == "PUT":
-                    if isinstance(test["data"], str):
-                        response = self.session.put(f"{BASE_URL}{test['endpoint']}", data=test["data"], headers=headers)
-                    else:
-                        response = self.session.put(f"{BASE_URL}{test['endpoint']}", json=test["data"])
-                elif test["method"] == "POST":
-                    if isinstance(test["data"], str):
-                        response = self.session.post(f"{BASE_URL}{test['endpoint']}", data=test["data"], headers=headers)
-                    else:
-                        response = self.session.post(f"{BASE_URL}{test['endpoint']}", json=test["data"])
-                
-                if response.status_code in test["expected_status"]:
+                expected_status = EXPECTED_ERROR_STATUSES[test["endpoint"]]
+                if response.status_code in expected_status:
                     self.log_result(f"Error Handling {test['endpoint']}", True, f"Correctly handles error with status {response.status_code}")
                 else:
-                    self.log_result(f"Error Handling {test['endpoint']}", False, f"Expected status in {test['expected_status']}, got {response.status_code}")
+                    self.log_result(f"Error Handling {test['endpoint']}", False, f"Expected status in {sorted(expected_status)}, got {response.status_code}")
                     all_handled = False
             except Exception as e:
                 # Some errors might be expected (like invalid JSON)
@@ -226,18 +193,18 @@ class ScrapMasterIntegrationTester:
     def test_security_headers(self):
         """Test for basic security considerations"""
         try:
-            response = self.session.get(f"{BASE_URL}/scrap-types")
+            status, headers, body = get_cached("/scrap-types")
             
             # Check that sensitive information is not exposed
             security_checks = []
             
             # Check response doesn't contain sensitive server info
-            server_header = response.headers.get('Server', '')
+            server_header = headers.get('Server', '')
             if 'uvicorn' not in server_header.lower():
                 security_checks.append("Server header doesn't expose internal details")
             
             # Check content type is correct
-            content_type = response.headers.get('Content-Type', '')
+            content_type = headers.get('Content-Type', '')
             if 'application/json' in content_type:
                 security_checks.append("Correct content type header")
             
@@ -253,44 +220,52 @@ class ScrapMasterIntegrationTester:
     
     def run_integration_tests(self):
         """Run all integration tests"""
+        clear_results()
+        # The shared probes and the validation POSTs go out together in one batch
+        probe_results, validation_outcomes = run_batch(PROBES, VALIDATION_REQUESTS)
         print("=" * 60)
         print("SCRAPMASTER BACKEND INTEGRATION TESTING")
         print("=" * 60)
         
         print("\n🏗️ API STRUCTURE TESTS")
-        self.test_api_structure()
+        self.test_api_structure(probe_results)
+        self.flush_output()
         
         print("\n✅ DATA VALIDATION TESTS")
-        self.test_data_validation()
+        self.test_data_validation(validation_outcomes)
+        self.flush_output()
         
         print("\n📋 RESPONSE FORMAT TESTS")
         self.test_response_formats()
+        self.flush_output()
         
         print("\n🛡️ ERROR HANDLING TESTS")
         self.test_error_handling()
+        self.flush_output()
         
         print("\n🔒 SECURITY TESTS")
         self.test_security_headers()
+        self.flush_output()
         
         # Summary
         print("\n" + "=" * 60)
         print("INTEGRATION TEST SUMMARY")
         print("=" * 60)
         
-        passed = sum(1 for r in self.test_results if r["success"])
-        failed = sum(1 for r in self.test_results if not r["success"])
-        total = len(self.test_results)
+        passed, failed = self._passed, self._failed
+        total = passed + failed
         
         print(f"Total Tests: {total}")
         print(f"Passed: {passed} ✅")
         print(f"Failed: {failed} ❌")
+        print(f"Skipped: {self._skipped} ⏭️")
         print(f"Success Rate: {(passed/total)*100:.1f}%")
         
         if failed > 0:
             print("\n❌ FAILED TESTS:")
-            for result in self.test_results:
-                if not result["success"]:
-                    print(f"  - {result['test']}: {result['message']}")
+            for i in self._failed_idx:
+                _, test_name, _, message, _ = self.test_results[i]
+                print(f"  - {test_name}: {message}")
         
         return passed, failed, total
 
@@ -299,16 +274,7 @@ if __name__ == "__main__":
     passed, failed, total = tester.run_integration_tests()
     
     # Save detailed results
-    with open("/app/backend_integration_results.json", "w") as f:
-        json.dump({
-            "summary": {
-                "total": total,
-                "passed": passed,
-                "failed": failed,
-                "success_rate": (passed/total)*100 if total > 0 else 0
-            },
-            "results": tester.test_results
-        }, f, indent=2)
+    tester.write_report("/app/backend_integration_results.json")
     
     print(f"\n📄 Detailed results saved to: /app/backend_integration_results.json")
     
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Shared HTTP probes and result recording for the ScrapMaster backend test scripts
+Within a test run each GET probe is issued once and its result shared by every test;
+probes with side effects (any non-GET) are sent every time. Probe batches are multiplexed over a single HTTP/2 connection
+"""
+
+import asyncio
+import atexit
+import io
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+except ImportError:
+    json_loads = json.loads
+
+    def json_dumps(obj):
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+BASE_URL = "https://scrapmaster-1.preview.emergentagent.com/api"
+# (connect, read) seconds; every request is bounded so a stalled host cannot hang the suite
+HTTP_TIMEOUT = (3.05, 10)
+
+# Absolute URLs for the paths hit through the requests session, built once
+FULL = {
+    path: BASE_URL + path
+    for path in (
+        "/auth/login",
+        "/auth/profile",
+        "/auth/logout",
+        "/scrap-types",
+        "/users/me",
+        "/scrap-items",
+        "/scrap-items/nonexistent-id/status",
+        "/dashboard/stats",
+        "/scrap-items/all",
+        "/companies",
+        "/sales",
+    )
+}
+
+# Pooled keep-alive session for one-off requests outside the probe batches
+SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=32,
+    max_retries=Retry(
+        total=2,
+        connect=2,
+        read=1,
+        backoff_factor=0.2,
+        status_forcelist=(502, 503, 504),
+        # Only idempotent methods are re-sent after a read error or retryable status
+        allowed_methods=frozenset({"GET", "PUT", "OPTIONS"})
+    )
+)
+SESSION.mount("https://", _ADAPTER)
+SESSION.mount("http://", _ADAPTER)
+# Content-Type is set per request, only on requests that carry a JSON body
+SESSION.headers.update({"Connection": "keep-alive"})
+
+def request(method, url, **kwargs):
+    """Send a one-off request through the pooled session with HTTP_TIMEOUT applied"""
+    return SESSION.request(method, url, timeout=HTTP_TIMEOUT, **kwargs)
+
+# (method, path, expected status) for every body-less probe shared between the scripts
+PROBES = [
+    # Auth endpoints
+    ("GET", "/auth/login", 200),
+    ("GET", "/auth/profile", 400),  # Should fail without session
+    ("POST", "/auth/logout", 200),
+
+    # Public endpoints
+    ("GET", "/scrap-types", 200),
+
+    # Protected endpoints (should return 401)
+    ("GET", "/users/me", 401),
+    ("GET", "/scrap-items", 401),
+    ("GET", "/dashboard/stats", 401),
+
+    # Admin endpoints (should return 401)
+    ("GET", "/scrap-items/all", 401),
+    ("GET", "/companies", 401),
+    ("GET", "/sales", 401),
+]
+
+# Statuses the API returns when a request is refused for missing auth or role
+AUTH_REJECTED = frozenset({401, 403})
+
+# (method, path) -> response, or the exception it raised, for every GET probe issued so far
+RESULTS = {}
+
+# One event loop and one HTTP/2 client for the whole process, so every batch is
+# multiplexed over the same connection and the TLS handshake happens once
+_RUNNER = asyncio.Runner()
+_client = None
+
+async def _run_all(requests_to_send):
+    """Send (method, path, kwargs) requests concurrently over the shared HTTP/2 client"""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            http2=True,
+            base_url=BASE_URL,
+            timeout=httpx.Timeout(HTTP_TIMEOUT[1], connect=HTTP_TIMEOUT[0]),
+            limits=httpx.Limits(max_keepalive_connections=1, max_connections=1)
+        )
+    # Failed requests come back as exception values rather than raising
+    return await asyncio.gather(
+        *[_client.request(method, path, **kwargs) for method, path, kwargs in requests_to_send],
+        return_exceptions=True
+    )
+
+@atexit.register
+def _close():
+    if _client is not None:
+        _RUNNER.run(_client.aclose())
+    _RUNNER.close()
+
+def send_all(requests_to_send):
+    """Send independent (method, path, kwargs) requests as one batch, returning responses or exceptions in input order"""
+    if not requests_to_send:
+        return []
+    return _RUNNER.run(_run_all(requests_to_send))
+
+def run_batch(probes, requests_to_send):
+    """Send probes, as run_probes does, and independent (method, path, kwargs) requests in one batch
+
+    Returns the probe results and the request outcomes in input order
+    """
+    keys = list(dict.fromkeys((method, path) for method, path, _ in probes))
+    pending = [key for key in keys if key[0] != "GET" or key not in RESULTS]
+    outcomes = send_all([(method, path, {}) for method, path in pending] + list(requests_to_send))
+    fresh = dict(zip(pending, outcomes))
+    RESULTS.update((key, response) for key, response in fresh.items() if key[0] == "GET")
+    return {key: fresh[key] if key in fresh else RESULTS[key] for key in keys}, outcomes[len(pending):]
+
+def run_probes(probes):
+    """Send, as one batch, each GET probe not yet in RESULTS and every non-GET probe
+
+    Only GET results are memoized. Returns {(method, path): response or exception}
+    for the given probes
+    """
+    return run_batch(probes, ())[0]
+
+def get_cached(path):
+    """Return (status_code, headers, body) for a shared GET probe, raising its request error if any"""
+    response = run_probes([("GET", path, None)])[("GET", path)]
+    if isinstance(response, Exception):
+        # A fresh exception each time, so the memoized one's traceback doesn't grow per raise
+        raise ConnectionError(f"GET {path} failed: {type(response).__name__}: {response}") from response
+    return response.status_code, response.headers, response.text
+
+def rejected_paths(statuses=AUTH_REJECTED):
+    """Return {path: status} for GET probes refused with one of statuses
+
+    Auth dependencies run before a well-formed body is validated, so such a
+    request to the same path is refused the same way. Malformed JSON is
+    rejected with 422 before auth runs, so the rule does not cover it
+    """
+    return {
+        path: response.status_code
+        for (method, path), response in RESULTS.items()
+        if method == "GET" and not isinstance(response, Exception) and response.status_code in statuses
+    }
+
+def clear_results():
+    """Forget previous probe results so a rerun in the same process hits the API again"""
+    RESULTS.clear()
+
+class ResultRecorder:
+    """Collects test results, echoes them per test group and writes the JSON report"""
+
+    def __init__(self):
+        # (monotonic_ns, test, success, message, details), success None when skipped; formatted by finalize_results
+        self.test_results = []
+        # Console lines are buffered here and written out once per test group
+        self._out = io.StringIO()
+        self._t0_wall = datetime.now()
+        self._t0_mono = time.monotonic_ns()
+        # Running tallies so the summary never rescans test_results
+        self._passed = 0
+        self._failed = 0
+        self._failed_idx = []
+        self._skipped = 0
+
+    def log_result(self, test_name, success, message, details=None):
+        """Log test result"""
+        line = " ".join(("✅ PASS:" if success else "❌ FAIL:", test_name, "-", message))
+        self.test_results.append((time.monotonic_ns(), test_name, success, message, details))
+        if success:
+            self._passed += 1
+        else:
+            self._failed += 1
+            self._failed_idx.append(len(self.test_results) - 1)
+        self._out.write(line + "\n")
+        if details and not success:
+            self._out.write(f"   Details: {details}\n")
+
+    def log_skip(self, test_name, message):
+        """Log a test that could not be checked, counted as neither passed nor failed"""
+        self.test_results.append((time.monotonic_ns(), test_name, None, message, None))
+        self._skipped += 1
+        self._out.write(" ".join(("⏭️ SKIP:", test_name, "-", message)) + "\n")
+
+    def flush_output(self):
+        """Write buffered result lines to stdout in one call"""
+        sys.stdout.write(self._out.getvalue())
+        self._out.seek(0)
+        self._out.truncate(0)
+
+    def finalize_results(self):
+        """Yield logged results as report dicts, converting timestamps as they are written"""
+        t0 = self._t0_wall
+        for mono_ns, test_name, success, message, details in self.test_results:
+            yield {
+                "test": test_name,
+                "success": success,
+                "message": message,
+                "timestamp": (t0 + timedelta(microseconds=(mono_ns - self._t0_mono) // 1000)).isoformat(),
+                "details": details or {}
+            }
+
+    def write_report(self, path):
+        """Write the summary and results to path, streaming one record at a time"""
+        passed, failed = self._passed, self._failed
+        total = passed + failed
+        summary = {
+            "total": total,
+            "passed": passed,
+            "failed": failed,
+            "skipped": self._skipped,
+            "success_rate": (passed/total)*100 if total > 0 else 0
+        }
+        with open(path, "wb") as f:
+            f.write(b'{"summary":')
+            f.write(json_dumps(summary))
+            f.write(b',"results":[')
+            for i, record in enumerate(self.finalize_results()):
+                if i:
+                    f.write(b",")
+                f.write(json_dumps(record))
+            f.write(b"]}")